@@ -3,14 +3,29 @@ from __future__ import annotations
 
 import json
 import base64
-import mimetypes
+import functools
+import io
+import logging
+import operator
+import sys
 from dataclasses import dataclass
 from enum import Enum
-from html import escape
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Sequence, TextIO
 from datetime import datetime
 
+try:
+    # Optional: orjson parst deutlich schneller, Fallback ist die Standardbibliothek
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+log = logging.getLogger(__name__)
+
+# Verzeichnis des Skripts (config.json, Logo, Reports)
+_HERE = Path(__file__).resolve().parent
+
 
 # =========================================================
 # Enums & Dataclasses
@@ -22,7 +37,7 @@ class Decision(str, Enum):
     NOT_ALLOWED = "NOT_ALLOWED"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PhotoContext:
     minors: bool
     identifiable: bool
@@ -32,35 +47,83 @@ class PhotoContext:
     consent_status: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Result:
     decision: Decision
     message: str
-    reasons: List[str]
+    reasons: Sequence[str]
     rule_id: Optional[str] = None
     legal_ref_keys: Optional[List[str]] = None
 
 
+# Interniert: Gleichheitsvergleiche mit Kontext-/Regelwerten enden meist beim Identitätscheck
+_CHANNELS = tuple(map(sys.intern, ("website", "social", "print")))
+_CONSENTS = tuple(map(sys.intern, ("alle", "teilweise", "unbekannt")))
+
+
 # =========================================================
 # Konfiguration
 # =========================================================
 
+@functools.lru_cache(maxsize=4)
+def _load_config_cached(path: str, mtime: float) -> Dict[str, Any]:
+    # mtime ist Teil des Cache-Keys: Änderungen an der Datei werden erkannt.
+    cfg = _json_loads(Path(path).read_bytes())
+    compile_rules(cfg)
+    return cfg
+
+
 def load_config() -> Dict[str, Any]:
-    path = Path(__file__).with_name("config.json")
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    """
+    Lädt config.json. Das Ergebnis wird pro Pfad+mtime gecacht,
+    wiederholte Aufrufe (Batch/Schleife) parsen die Datei nicht erneut.
+    """
+    path = _HERE / "config.json"
+    return _load_config_cached(str(path), path.stat().st_mtime)
 
 
 # =========================================================
 # Input Helpers
 # =========================================================
 
+_YES = frozenset(("j", "ja", "y", "yes"))
+_NO = frozenset(("n", "nein", "no"))
+
+_CHANNEL_MAP = {
+    "web": "website",
+    "website": "website",
+    "homepage": "website",
+    "site": "website",
+    "social": "social",
+    "instagram": "social",
+    "facebook": "social",
+    "tiktok": "social",
+    "print": "print",
+    "flyer": "print",
+    "plakat": "print",
+    "broschüre": "print",
+    "broschuere": "print",
+}
+
+_CONSENT_MAP = {
+    "alle": "alle",
+    "voll": "alle",
+    "ja": "alle",
+    "teilweise": "teilweise",
+    "einige": "teilweise",
+    "unbekannt": "unbekannt",
+    "?": "unbekannt",
+    # casefold() macht aus „weiß nicht“ bereits „weiss nicht“
+    "weiss nicht": "unbekannt",
+}
+
+
 def yes_no(prompt: str) -> bool:
     while True:
-        val = input(prompt + " (j/n): ").strip().lower()
-        if val in ("j", "ja", "y", "yes"):
+        val = input(prompt + " (j/n): ").strip().casefold()
+        if val in _YES:
             return True
-        if val in ("n", "nein", "no"):
+        if val in _NO:
             return False
         # Keine Fehlermeldung im „kryptischen“ Sinn – nur stille Wiederholung wäre auch möglich.
         # Ich gebe minimal Feedback, damit klar ist, warum erneut gefragt wird.
@@ -72,25 +135,10 @@ def ask_channel(prompt: str = "Kanal (website/social/print): ") -> str:
     Fragt so lange nach, bis eine gültige Kanal-Eingabe vorliegt.
     Ungültige Eingaben werden effektiv ignoriert (keine Exception).
     """
-    mapping = {
-        "web": "website",
-        "website": "website",
-        "homepage": "website",
-        "site": "website",
-        "social": "social",
-        "instagram": "social",
-        "facebook": "social",
-        "tiktok": "social",
-        "print": "print",
-        "flyer": "print",
-        "plakat": "print",
-        "broschüre": "print",
-        "broschuere": "print",
-    }
     while True:
-        raw = input(prompt).strip().lower()
-        if raw in mapping:
-            return mapping[raw]
+        raw = input(prompt).strip().casefold()
+        if raw in _CHANNEL_MAP:
+            return sys.intern(_CHANNEL_MAP[raw])
         # Eingabe wird ignoriert, wir fragen einfach erneut (kein Traceback)
         print("Ungültig. Bitte website, social oder print eingeben.")
 
@@ -100,21 +148,10 @@ def ask_consent(prompt: str = "Einwilligung (alle/teilweise/unbekannt): ") -> st
     Fragt so lange nach, bis eine gültige Einwilligungs-Eingabe vorliegt.
     Ungültige Eingaben werden effektiv ignoriert (keine Exception).
     """
-    mapping = {
-        "alle": "alle",
-        "voll": "alle",
-        "ja": "alle",
-        "teilweise": "teilweise",
-        "einige": "teilweise",
-        "unbekannt": "unbekannt",
-        "?": "unbekannt",
-        "weiß nicht": "unbekannt",
-        "weiss nicht": "unbekannt",
-    }
     while True:
-        raw = input(prompt).strip().lower()
-        if raw in mapping:
-            return mapping[raw]
+        raw = input(prompt).strip().casefold()
+        if raw in _CONSENT_MAP:
+            return sys.intern(_CONSENT_MAP[raw])
         print("Ungültig. Bitte alle, teilweise oder unbekannt eingeben.")
 
 
@@ -122,36 +159,266 @@ def ask_consent(prompt: str = "Einwilligung (alle/teilweise/unbekannt): ") -> st
 # Regel-Engine (Config-driven)
 # =========================================================
 
-def rule_matches(ctx: PhotoContext, when: Dict[str, Any]) -> bool:
-    if "consent_status" in when and ctx.consent_status != when["consent_status"]:
-        return False
-    if "minors" in when and ctx.minors != when["minors"]:
-        return False
-    if "identifiable" in when and ctx.identifiable != when["identifiable"]:
-        return False
-    if "group_photo" in when and ctx.group_photo != when["group_photo"]:
-        return False
-    if "prominent_subject" in when and ctx.prominent_subject != when["prominent_subject"]:
-        return False
-    if "channel_in" in when and ctx.channel not in when["channel_in"]:
-        return False
+# Felder aus "when", die direkt mit PhotoContext-Attributen verglichen werden
+_WHEN_FIELDS = ("consent_status", "minors", "identifiable", "group_photo", "prominent_subject")
+
+
+def _rules_disjoint(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """True, wenn zwei "when"-Bedingungen nie gleichzeitig zutreffen können."""
+    for field in _WHEN_FIELDS:
+        if field in a and field in b and a[field] != b[field]:
+            return True
+    if "channel_in" in a and "channel_in" in b:
+        return not set(a["channel_in"]) & set(b["channel_in"])
+    return False
+
+
+def _rule_covers(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """True, wenn jede Situation, auf die Bedingung b zutrifft, auch a erfüllt."""
+    for field in _WHEN_FIELDS:
+        if field in a and (field not in b or a[field] != b[field]):
+            return False
+    if "channel_in" in a:
+        return "channel_in" in b and set(b["channel_in"]) <= set(a["channel_in"])
     return True
 
 
+def remove_unreachable_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Entfernt Duplikate und Regeln, die von einer früheren Regel vollständig
+    abgedeckt werden – diese können bei "erste Regel gewinnt" nie greifen.
+    """
+    kept: List[Dict[str, Any]] = []
+    for rule in rules:
+        when = rule.get("when", {})
+        cover = next((k for k in kept if _rule_covers(k.get("when", {}), when)), None)
+        if cover is not None:
+            log.debug("Regel %s entfernt: wird von %s vollständig abgedeckt", rule.get("id"), cover.get("id"))
+            continue
+        kept.append(rule)
+    return kept
+
+
+def _selectivity_key(rule: Dict[str, Any]) -> tuple[int, int]:
+    when = rule.get("when", {})
+    discriminative = "consent_status" in when or "channel_in" in when
+    return (0 if discriminative else 1, -len(when))
+
+
+def optimize_rule_order(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sortiert Regeln so um, dass selektive Regeln zuerst geprüft werden,
+    ohne das Ergebnis zu verändern: Umsortiert wird nur innerhalb von
+    aufeinanderfolgenden Blöcken, deren Bedingungen sich paarweise
+    ausschließen (dort ist die Reihenfolge egal, es greift höchstens eine).
+    """
+    ordered: List[Dict[str, Any]] = []
+    block: List[Dict[str, Any]] = []
+    for rule in rules:
+        when = rule.get("when", {})
+        if not all(_rules_disjoint(when, other.get("when", {})) for other in block):
+            ordered.extend(sorted(block, key=_selectivity_key))
+            block = []
+        block.append(rule)
+    ordered.extend(sorted(block, key=_selectivity_key))
+    return ordered
+
+
+# Bit-Kodierung des Kontexts: 4 Bool-Felder + Kanal und Einwilligung jeweils one-hot
+_BOOL_BITS = {
+    "minors": 1 << 0,
+    "identifiable": 1 << 1,
+    "group_photo": 1 << 2,
+    "prominent_subject": 1 << 3,
+}
+_CHANNEL_BITS = {channel: 1 << (4 + i) for i, channel in enumerate(_CHANNELS)}
+_CONSENT_BITS = {consent: 1 << (4 + len(_CHANNELS) + i) for i, consent in enumerate(_CONSENTS)}
+_ALL_CHANNEL_BITS = sum(_CHANNEL_BITS.values())
+_ALL_CONSENT_BITS = sum(_CONSENT_BITS.values())
+# Liegt außerhalb jeder Maske: (bits & mask) == req ist dann nie erfüllt
+_NEVER_BIT = 1 << (4 + len(_CHANNELS) + len(_CONSENTS))
+
+# Ab dieser Regelanzahl lohnt sich der numpy-Overhead gegenüber der Python-Schleife
+_VECTORIZE_MIN_RULES = 64
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy() -> Any:
+    """
+    Importiert numpy (optional) erst bei Bedarf – der Import kostet beim
+    CLI-Start spürbar Zeit. Auch ein fehlgeschlagener Import wird gecacht.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def encode_ctx(ctx: PhotoContext) -> Optional[int]:
+    """
+    Kodiert den Kontext als Bitmuster. None bei Kanal/Einwilligung außerhalb
+    der bekannten Werte – dann greift die Prüfung über rule_matches.
+    """
+    channel = _CHANNEL_BITS.get(ctx.channel)
+    consent = _CONSENT_BITS.get(ctx.consent_status)
+    if channel is None or consent is None:
+        return None
+    # Bitpositionen wie in _BOOL_BITS
+    return (
+        (ctx.minors << 0)
+        | (ctx.identifiable << 1)
+        | (ctx.group_photo << 2)
+        | (ctx.prominent_subject << 3)
+        | channel
+        | consent
+    )
+
+
+def _rule_bits(when: Dict[str, Any]) -> tuple[int, int]:
+    """Liefert (required, mask): eine Regel trifft zu, wenn (ctx_bits & mask) == required."""
+    required = 0
+    mask = 0
+    for field, bit in _BOOL_BITS.items():
+        if field not in when:
+            continue
+        mask |= bit
+        if when[field] == True:  # noqa: E712 - gleiche Semantik wie rule_matches
+            required |= bit
+        elif when[field] != False:  # noqa: E712
+            required |= _NEVER_BIT
+    if "consent_status" in when:
+        # Unbekannter Wert: Maske ohne Bit -> kein bekannter Kontext passt
+        mask |= _ALL_CONSENT_BITS
+        required |= _CONSENT_BITS.get(when["consent_status"], 0)
+    if "channel_in" in when:
+        allowed = 0
+        for channel in when["channel_in"]:
+            allowed |= _CHANNEL_BITS.get(channel, 0)
+        mask |= _ALL_CHANNEL_BITS & ~allowed
+    return required, mask
+
+
+def compile_rules(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Übersetzt die "when"-Bedingungen aller Regeln einmalig in Prädikate
+    (attrgetter + Sollwert), damit die Auswertung pro Aufruf nur noch
+    Vergleiche ausführt statt das Dict abzulaufen.
+
+    Standard ("rules_optimization": "basic"): nie greifende Regeln werden
+    entfernt und sich ausschließende Regeln nach Selektivität sortiert.
+    Mit "none" bleibt die Liste exakt wie in "rules_ordered".
+    """
+    rules = cfg.get("rules_ordered", [])
+    for rule in rules:
+        when = rule.get("when", {})
+        if isinstance(when.get("consent_status"), str):
+            when["consent_status"] = sys.intern(when["consent_status"])
+        if "channel_in" in when:
+            when["channel_in"] = [sys.intern(ch) if isinstance(ch, str) else ch for ch in when["channel_in"]]
+        rule["_pred"] = tuple(
+            (operator.attrgetter(field), when[field]) for field in _WHEN_FIELDS if field in when
+        )
+        rule["_channels"] = frozenset(when["channel_in"]) if "channel_in" in when else None
+        rule["_req"], rule["_mask"] = _rule_bits(when)
+        rule["_extra_reasons"] = tuple(rule.get("extra_reasons", []))
+
+    optimization = cfg.get("rules_optimization", "basic")
+    if optimization == "basic":
+        cfg["_rules"] = optimize_rule_order(remove_unreachable_rules(rules))
+    elif optimization == "none":
+        cfg["_rules"] = list(rules)
+    else:
+        raise ValueError(f"Unbekannte rules_optimization: {optimization!r} (erlaubt: basic, none)")
+
+    # Index {consent_status: {channel: [rule, ...]}}; "*" = keine Einschränkung.
+    # "_order" hält die Auswertungsreihenfolge fest, um Buckets wieder zu mischen.
+    index: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for order, rule in enumerate(cfg["_rules"]):
+        rule["_order"] = order
+        when = rule.get("when", {})
+        by_channel = index.setdefault(when.get("consent_status", "*"), {})
+        for channel in rule["_channels"] or ("*",):
+            by_channel.setdefault(channel, []).append(rule)
+    cfg["_index"] = index
+    # Für alle bekannten Kombinationen die gemischte, sortierte Kandidatenliste vorab bilden
+    cfg["_buckets"] = {
+        consent: {channel: _merge_buckets(index, consent, channel) for channel in _CHANNELS}
+        for consent in _CONSENTS
+    }
+
+    cfg["_rule_req"] = cfg["_rule_mask"] = None
+    np = _numpy() if len(cfg["_rules"]) >= _VECTORIZE_MIN_RULES else None
+    if np is not None:
+        cfg["_rule_req"] = np.array([rule["_req"] for rule in cfg["_rules"]], dtype=np.uint16)
+        cfg["_rule_mask"] = np.array([rule["_mask"] for rule in cfg["_rules"]], dtype=np.uint16)
+
+    cfg["_compiled"] = True
+    return cfg
+
+
+def _merge_buckets(
+    index: Dict[str, Dict[str, List[Dict[str, Any]]]], consent: str, channel: str
+) -> List[Dict[str, Any]]:
+    by_consent = index.get(consent, {})
+    wildcard = index.get("*", {})
+    return sorted(
+        by_consent.get(channel, [])
+        + by_consent.get("*", [])
+        + wildcard.get(channel, [])
+        + wildcard.get("*", []),
+        key=operator.itemgetter("_order"),
+    )
+
+
+def rule_matches(ctx: PhotoContext, rule: Dict[str, Any]) -> bool:
+    channels = rule["_channels"]
+    return all(getter(ctx) == value for getter, value in rule["_pred"]) and (
+        channels is None or ctx.channel in channels
+    )
+
+
+def _find_rule(ctx: PhotoContext, cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    ctx_bits = encode_ctx(ctx)
+    if cfg["_rule_mask"] is not None and ctx_bits is not None:
+        hits = (ctx_bits & cfg["_rule_mask"]) == cfg["_rule_req"]
+        idx = int(hits.argmax())
+        return cfg["_rules"][idx] if hits[idx] else None
+
+    by_channel = cfg["_buckets"].get(ctx.consent_status)
+    candidates = by_channel.get(ctx.channel) if by_channel else None
+    if candidates is None:
+        candidates = _merge_buckets(cfg["_index"], ctx.consent_status, ctx.channel)
+
+    if ctx_bits is None:
+        # Unbekannter Kanal/Einwilligung: nicht als Bitmuster darstellbar
+        for rule in candidates:
+            if rule_matches(ctx, rule):
+                return rule
+        return None
+
+    for rule in candidates:
+        if (ctx_bits & rule["_mask"]) == rule["_req"]:
+            return rule
+    return None
+
+
 def apply_config_rules(
-    ctx: PhotoContext, cfg: Dict[str, Any], base_reasons: List[str]
+    ctx: PhotoContext, cfg: Dict[str, Any], base_reasons: Sequence[str]
 ) -> Optional[Result]:
+    if not cfg.get("_compiled"):
+        compile_rules(cfg)
 
-    for rule in cfg.get("rules_ordered", []):
-        if rule_matches(ctx, rule.get("when", {})):
-            return Result(
-                decision=Decision[rule["decision"]],
-                message=rule["message"],
-                reasons=base_reasons + rule.get("extra_reasons", []),
-                rule_id=rule.get("id"),
-                legal_ref_keys=rule.get("legal_refs", []),
-            )
-    return None
+    rule = _find_rule(ctx, cfg)
+    if rule is None:
+        return None
+    return Result(
+        decision=Decision[rule["decision"]],
+        message=rule["message"],
+        reasons=tuple(base_reasons) + rule["_extra_reasons"],
+        rule_id=rule.get("id"),
+        legal_ref_keys=rule.get("legal_refs", []),
+    )
 
 
 # =========================================================
@@ -189,19 +456,22 @@ def calculate_sensitivity(ctx: PhotoContext) -> tuple[str, str]:
 # Entscheidungslogik
 # =========================================================
 
-def evaluate(ctx: PhotoContext, cfg: Dict[str, Any]) -> Result:
-    reasons: List[str] = []
-
-    reasons.append("Personen sind erkennbar." if ctx.identifiable else "Personen sind nicht erkennbar.")
-    reasons.append("Minderjährige beteiligt." if ctx.minors else "Keine Minderjährigen.")
-    reasons.append("Gruppenfoto." if ctx.group_photo else "Einzelportrait oder kleine Gruppe.")
-    reasons.append(
+@functools.lru_cache(maxsize=256)
+def _build_base_reasons(ctx: PhotoContext) -> tuple[str, ...]:
+    return (
+        "Personen sind erkennbar." if ctx.identifiable else "Personen sind nicht erkennbar.",
+        "Minderjährige beteiligt." if ctx.minors else "Keine Minderjährigen.",
+        "Gruppenfoto." if ctx.group_photo else "Einzelportrait oder kleine Gruppe.",
         "Eine oder wenige Personen sind deutlich hervorgehoben (portraitähnlich)."
         if ctx.prominent_subject
-        else "Keine einzelne Person ist deutlich hervorgehoben."
+        else "Keine einzelne Person ist deutlich hervorgehoben.",
+        f"Kanal: {ctx.channel}.",
+        f"Einwilligung: {ctx.consent_status}.",
     )
-    reasons.append(f"Kanal: {ctx.channel}.")
-    reasons.append(f"Einwilligung: {ctx.consent_status}.")
+
+
+def evaluate(ctx: PhotoContext, cfg: Dict[str, Any]) -> Result:
+    reasons = _build_base_reasons(ctx)
 
     hit = apply_config_rules(ctx, cfg, reasons)
     if hit:
@@ -214,6 +484,19 @@ def evaluate(ctx: PhotoContext, cfg: Dict[str, Any]) -> Result:
     )
 
 
+def make_evaluator(cfg: Dict[str, Any]) -> Callable[[PhotoContext], Result]:
+    """
+    Liefert eine an cfg gebundene, memoisierte Variante von evaluate().
+    Der Eingaberaum ist klein (wenige Bool-/Enum-Felder), gleiche Eingaben
+    werden daher nach dem ersten Aufruf direkt aus dem Cache beantwortet.
+    """
+    @functools.lru_cache(maxsize=256)
+    def _eval(ctx: PhotoContext) -> Result:
+        return evaluate(ctx, cfg)
+
+    return _eval
+
+
 # =========================================================
 # DSGVO-Link-Auflösung
 # =========================================================
@@ -234,105 +517,106 @@ def resolve_legal_refs(cfg: Dict[str, Any], keys: Optional[List[str]]) -> List[D
 # Logo laden
 # =========================================================
 
+# Für ein Logo reichen wenige Formate – spart die Initialisierung von mimetypes
+_LOGO_MIMES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".svg": "image/svg+xml",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+@functools.lru_cache(maxsize=4)
+def _load_logo_data_uri_cached(logo_path: str, mtime_ns: int, size: int) -> str:
+    path = Path(logo_path)
+    mime = _LOGO_MIMES.get(path.suffix.lower(), "image/png")
+
+    data = path.read_bytes()
+    b64 = base64.b64encode(data).decode("ascii")
+    return f"data:{mime};base64,{b64}"
+
+
 def load_logo_data_uri(cfg: Dict[str, Any]) -> Optional[str]:
     logo_path = cfg.get("logo_path")
     if not logo_path:
         return None
 
-    path = Path(__file__).with_name(logo_path)
+    path = _HERE / logo_path
     if not path.exists():
         return None
 
-    mime, _ = mimetypes.guess_type(str(path))
-    if not mime:
-        mime = "image/png"
-
-    data = path.read_bytes()
-    b64 = base64.b64encode(data).decode("ascii")
-    return f"data:{mime};base64,{b64}"
+    # Base64-Kodierung nur einmal pro Prozess (bzw. nach Änderung der Datei)
+    st = path.stat()
+    return _load_logo_data_uri_cached(str(path), st.st_mtime_ns, st.st_size)
 
 
 # =========================================================
 # HTML Report
 # =========================================================
 
-def render_report(ctx: PhotoContext, result: Result, cfg: Dict[str, Any]) -> str:
-    sens_level, sens_msg = calculate_sensitivity(ctx)
-    legal_refs = resolve_legal_refs(cfg, result.legal_ref_keys)
-
-    logo_uri = load_logo_data_uri(cfg)
-    logo_html = ""
-    if logo_uri:
-        logo_html = f'<img src="{logo_uri}" alt="Logo" style="height:40px;vertical-align:middle;">'
-
-    reasons_html = "\n".join(f"<li>{escape(r)}</li>" for r in result.reasons)
-
-    legal_html = ""
-    if legal_refs:
-        items = []
-        for ref in legal_refs:
-            label = escape(ref.get("label", ""))
-            url = escape(ref.get("url", ""))
-            items.append(f'<li><a href="{url}" target="_blank" rel="noopener">{label}</a></li>')
-        legal_html = "<ul>" + "\n".join(items) + "</ul>"
-
-    rule_info = ""
-    if result.rule_id:
-        rule_info = f"<p><b>Regel-ID:</b> {escape(result.rule_id)}</p>"
-
-    ctx_table = f"""
+_CTX_TABLE_TEMPLATE = Template("""
     <table>
-      <tr><th>Minderjährige</th><td>{'Ja' if ctx.minors else 'Nein'}</td></tr>
-      <tr><th>Erkennbar</th><td>{'Ja' if ctx.identifiable else 'Nein'}</td></tr>
-      <tr><th>Gruppenfoto</th><td>{'Ja' if ctx.group_photo else 'Nein'}</td></tr>
-      <tr><th>Hervorgehoben</th><td>{'Ja' if ctx.prominent_subject else 'Nein'}</td></tr>
-      <tr><th>Kanal</th><td>{escape(ctx.channel)}</td></tr>
-      <tr><th>Einwilligung</th><td>{escape(ctx.consent_status)}</td></tr>
-      <tr><th>Sensibilität</th><td>{escape(sens_level)} – {escape(sens_msg)}</td></tr>
+      <tr><th>Minderjährige</th><td>${minors}</td></tr>
+      <tr><th>Erkennbar</th><td>${identifiable}</td></tr>
+      <tr><th>Gruppenfoto</th><td>${group_photo}</td></tr>
+      <tr><th>Hervorgehoben</th><td>${prominent_subject}</td></tr>
+      <tr><th>Kanal</th><td>${channel}</td></tr>
+      <tr><th>Einwilligung</th><td>${consent_status}</td></tr>
+      <tr><th>Sensibilität</th><td>${sens_level} – ${sens_msg}</td></tr>
     </table>
-    """
+    """)
 
-    now = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-    return f"""<!doctype html>
+# Der Report wird abschnittsweise geschrieben (siehe render_report_to),
+# daher ist die Vorlage in statische Teile und kleine Templates zerlegt.
+_REPORT_HEAD = """<!doctype html>
 <html lang="de">
 <head>
 <meta charset="utf-8">
 <title>Foto-Check Report</title>
 <style>
-  body {{ font-family: Arial, sans-serif; margin: 24px; }}
-  h1 {{ margin-top: 0; }}
-  .header {{ display:flex; align-items:center; gap:16px; }}
-  table {{ border-collapse: collapse; width: 100%; margin: 16px 0; }}
-  th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-  th {{ background: #f5f5f5; width: 200px; }}
-  .box {{ border: 1px solid #ddd; padding: 12px; border-radius: 8px; }}
-  .decision {{ font-size: 18px; font-weight: bold; }}
-  .muted {{ color:#666; font-size: 12px; }}
+  body { font-family: Arial, sans-serif; margin: 24px; }
+  h1 { margin-top: 0; }
+  .header { display:flex; align-items:center; gap:16px; }
+  table { border-collapse: collapse; width: 100%; margin: 16px 0; }
+  th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+  th { background: #f5f5f5; width: 200px; }
+  .box { border: 1px solid #ddd; padding: 12px; border-radius: 8px; }
+  .decision { font-size: 18px; font-weight: bold; }
+  .muted { color:#666; font-size: 12px; }
 </style>
 </head>
 <body>
   <div class="header">
-    {logo_html}
+    """
+
+_REPORT_SUMMARY_TEMPLATE = Template("""
     <div>
       <h1>Foto-Check Report</h1>
-      <div class="muted">Erstellt: {escape(now)}</div>
+      <div class="muted">Erstellt: ${now}</div>
     </div>
   </div>
 
   <div class="box">
-    <div class="decision">{escape(result.message)}</div>
-    {rule_info}
-    {ctx_table}
+    <div class="decision">${message}</div>
+    ${rule_info}
+    """)
+
+_REPORT_REASONS_HEAD = """
   </div>
 
   <h2>Begründungen</h2>
   <ul>
-    {reasons_html}
+    """
+
+_REPORT_LEGAL_HEAD = """
   </ul>
 
   <h2>Rechtsgrundlagen / Hinweise</h2>
-  {legal_html if legal_html else "<p class='muted'>Keine Links hinterlegt.</p>"}
+  """
+
+_REPORT_FOOT = """
 
   <hr>
   <p class="muted">
@@ -343,11 +627,108 @@ def render_report(ctx: PhotoContext, result: Result, cfg: Dict[str, Any]) -> str
 """
 
 
-def write_report(html: str) -> Path:
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+# Entspricht html.escape(s, quote=True), aber in einem Durchlauf statt mehrerer replace()
+_HTML_TRANS = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"})
+
+
+def _esc(s: str) -> str:
+    return s.translate(_HTML_TRANS)
+
+
+def _yes_no_label(value: bool) -> str:
+    return "Ja" if value else "Nein"
+
+
+def render_report_to(
+    fp: TextIO, ctx: PhotoContext, result: Result, cfg: Dict[str, Any], *, now: Optional[datetime] = None
+) -> None:
+    """Schreibt den HTML-Report abschnittsweise in fp, ohne das Dokument komplett im Speicher aufzubauen."""
+    now = now or datetime.now()
+    sens_level, sens_msg = calculate_sensitivity(ctx)
+
+    fp.write(_REPORT_HEAD)
+
+    logo_uri = load_logo_data_uri(cfg)
+    if logo_uri:
+        fp.write(f'<img src="{logo_uri}" alt="Logo" style="height:40px;vertical-align:middle;">')
+
+    rule_info = ""
+    if result.rule_id:
+        rule_info = f"<p><b>Regel-ID:</b> {_esc(result.rule_id)}</p>"
+
+    fp.write(
+        _REPORT_SUMMARY_TEMPLATE.substitute(
+            now=_esc(now.strftime("%Y-%m-%d %H:%M")),
+            message=_esc(result.message),
+            rule_info=rule_info,
+        )
+    )
+
+    # Textfelder werden hier einmalig escaped, die Templates setzen nur noch ein
+    text_fields = {
+        "channel": ctx.channel,
+        "consent_status": ctx.consent_status,
+        "sens_level": sens_level,
+        "sens_msg": sens_msg,
+    }
+    fp.write(
+        _CTX_TABLE_TEMPLATE.substitute(
+            {k: _esc(v) for k, v in text_fields.items()},
+            minors=_yes_no_label(ctx.minors),
+            identifiable=_yes_no_label(ctx.identifiable),
+            group_photo=_yes_no_label(ctx.group_photo),
+            prominent_subject=_yes_no_label(ctx.prominent_subject),
+        )
+    )
+
+    fp.write(_REPORT_REASONS_HEAD)
+    for i, r in enumerate(result.reasons):
+        if i:
+            fp.write("\n")
+        fp.write(f"<li>{_esc(r)}</li>")
+
+    fp.write(_REPORT_LEGAL_HEAD)
+    legal_refs = resolve_legal_refs(cfg, result.legal_ref_keys)
+    if legal_refs:
+        fp.write("<ul>")
+        for i, ref in enumerate(legal_refs):
+            label = _esc(ref.get("label", ""))
+            url = _esc(ref.get("url", ""))
+            if i:
+                fp.write("\n")
+            fp.write(f'<li><a href="{url}" target="_blank" rel="noopener">{label}</a></li>')
+        fp.write("</ul>")
+    else:
+        fp.write("<p class='muted'>Keine Links hinterlegt.</p>")
+
+    fp.write(_REPORT_FOOT)
+
+
+def render_report(
+    ctx: PhotoContext, result: Result, cfg: Dict[str, Any], *, now: Optional[datetime] = None
+) -> str:
+    buf = io.StringIO()
+    render_report_to(buf, ctx, result, cfg, now=now)
+    return buf.getvalue()
+
+
+def write_report(
+    ctx: PhotoContext, result: Result, cfg: Dict[str, Any], *, now: Optional[datetime] = None
+) -> Path:
+    # Ein Zeitpunkt für Dateiname und "Erstellt" im Report
+    now = now or datetime.now()
+    timestamp = now.strftime("%Y-%m-%d_%H-%M")
     filename = f"report_{timestamp}.html"
-    path = Path(__file__).with_name(filename)
-    path.write_text(html, encoding="utf-8")
+    path = _HERE / filename
+    # Erst in eine temporäre Datei schreiben: bricht das Rendern ab, bleibt kein halber Report liegen
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    try:
+        with tmp.open("w", encoding="utf-8", buffering=64 * 1024) as f:
+            render_report_to(f, ctx, result, cfg, now=now)
+        tmp.replace(path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
     return path
 
 
@@ -378,7 +759,8 @@ def main():
         consent_status=consent_status,
     )
 
-    result = evaluate(ctx, cfg)
+    evaluator = make_evaluator(cfg)
+    result = evaluator(ctx)
     sens_level, sens_msg = calculate_sensitivity(ctx)
 
     print("\nErgebnis:")
@@ -395,8 +777,7 @@ def main():
             print(f" - {ref.get('label')}: {ref.get('url')}")
 
     if yes_no("\nHTML-Report erzeugen?"):
-        html = render_report(ctx, result, cfg)
-        out = write_report(html)
+        out = write_report(ctx, result, cfg, now=datetime.now())
         print(f"Report gespeichert: {out}")
 
 
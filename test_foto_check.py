@@ -0,0 +1,105 @@
+# test_foto_check.py
+import copy
+import itertools
+import json
+import random
+import unittest
+
+import foto_check
+
+# Bekannte Werte plus ein unbekannter Wert je Feld (greift über rule_matches)
+_CHANNELS = ("website", "social", "print", "fax")
+_CONSENTS = ("alle", "teilweise", "unbekannt", "mündlich")
+
+
+def all_contexts():
+    for m, i, g, p, ch, cs in itertools.product(
+        (True, False), (True, False), (True, False), (True, False), _CHANNELS, _CONSENTS
+    ):
+        yield foto_check.PhotoContext(m, i, g, p, ch, cs)
+
+
+def reference_rule_id(ctx, rules):
+    """Erste passende Regel in Autoren-Reihenfolge, ohne jede Optimierung."""
+    for rule in rules:
+        when = rule.get("when", {})
+        if any(
+            field in when and getattr(ctx, field) != when[field]
+            for field in ("consent_status", "minors", "identifiable", "group_photo", "prominent_subject")
+        ):
+            continue
+        if "channel_in" in when and ctx.channel not in when["channel_in"]:
+            continue
+        return rule.get("id")
+    return None
+
+
+def outcome(result):
+    return (
+        result.decision,
+        result.message,
+        tuple(result.reasons),
+        result.rule_id,
+        tuple(result.legal_ref_keys or ()),
+    )
+
+
+def random_config(rnd, n_rules):
+    rules = []
+    for i in range(n_rules):
+        when = {}
+        for field in ("minors", "identifiable", "group_photo", "prominent_subject"):
+            if rnd.random() < 0.4:
+                when[field] = rnd.random() < 0.5
+        if rnd.random() < 0.5:
+            when["consent_status"] = rnd.choice(_CONSENTS)
+        if rnd.random() < 0.5:
+            when["channel_in"] = rnd.sample(_CHANNELS, rnd.randint(1, 3))
+        rules.append(
+            {
+                "id": f"r{i}",
+                "when": when,
+                "decision": rnd.choice(["ALLOWED", "LIMITED", "NOT_ALLOWED"]),
+                "message": f"Regel {i}",
+                "extra_reasons": [f"Grund {i}"],
+                "legal_refs": ["gdpr_art6"],
+            }
+        )
+    return {"rules_ordered": rules}
+
+
+class RuleEngineConsistencyTest(unittest.TestCase):
+    """
+    Optimiertes Regelwerk ("basic": entfernen, umsortieren, Index, Bitmasken,
+    ggf. numpy) muss dieselben Ergebnisse liefern wie "none" und wie eine
+    naive Prüfung in Autoren-Reihenfolge.
+    """
+
+    def assert_modes_agree(self, raw_cfg):
+        compiled = {}
+        for mode in ("basic", "none"):
+            cfg = copy.deepcopy(raw_cfg)
+            cfg["rules_optimization"] = mode
+            compiled[mode] = foto_check.compile_rules(cfg)
+
+        for ctx in all_contexts():
+            with self.subTest(ctx=ctx):
+                basic = foto_check.evaluate(ctx, compiled["basic"])
+                none = foto_check.evaluate(ctx, compiled["none"])
+                self.assertEqual(outcome(basic), outcome(none))
+                self.assertEqual(basic.rule_id, reference_rule_id(ctx, raw_cfg["rules_ordered"]))
+
+    def test_shipped_config(self):
+        raw_cfg = json.loads((foto_check._HERE / "config.json").read_text("utf-8"))
+        self.assert_modes_agree(raw_cfg)
+
+    def test_random_configs(self):
+        rnd = random.Random(1234)
+        # Ab _VECTORIZE_MIN_RULES Regeln wird (falls installiert) numpy genutzt
+        for n_rules in (3, 10, 40, foto_check._VECTORIZE_MIN_RULES, 150):
+            for _ in range(12):
+                self.assert_modes_agree(random_config(rnd, n_rules))
+
+
+if __name__ == "__main__":
+    unittest.main()